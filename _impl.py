@@ -0,0 +1,71 @@
+import click
+
+
+def _get_project():
+    # project pulls in util, json, shutil, runpy, ...; import it only once a command runs so
+    # that listing commands for --help stays cheap
+    from project import get_project
+    return get_project()
+
+
+@click.command()
+def init():
+    click.secho("Initializing new project at current directory...", fg="yellow")
+    project = _get_project()
+    project.initialize()
+    click.secho("Success!", fg="green")
+
+
+@click.command()
+def lint():
+    project = _get_project()
+    project.load()
+    project.lint()
+
+
+@click.command()
+def rebuild():
+    click.secho("Rebuildng project...", fg="yellow")
+    project = _get_project().load()
+    project.rebuild()
+    click.secho("Success!", fg="green")
+
+
+@click.command()
+@click.argument("module_name")
+def module(module_name):
+    click.secho(f"Creating new module {module_name}...", fg="yellow")
+    project = _get_project()
+    project.load()
+    project.create_module(module_name)
+    click.secho("Success!", fg="green")
+
+
+@click.command()
+@click.argument("script_name")
+def script(script_name):
+    click.secho(f"Creating new script {script_name}...", fg="yellow")
+    project = _get_project()
+    project.load()
+    project.create_script(script_name)
+    click.secho("Success!", fg="green")
+
+
+@click.command()
+@click.argument("script_name")
+@click.option("--isolated", is_flag=True, help="Run the script in a separate python process.")
+def run(script_name, isolated):
+    click.secho(f"Running script {script_name}...", fg="yellow")
+    project = _get_project()
+    project.load()
+    project.run_script(script_name, isolated=isolated)
+
+
+@click.command()
+@click.argument("script_name")
+@click.option("--isolated", is_flag=True, help="Run the script in a separate python process.")
+def debug(script_name, isolated):
+    click.secho(f"Running script {script_name}...", fg="yellow")
+    project = _get_project()
+    project.load()
+    project.debug_script(script_name, isolated=isolated)
@@ -1,102 +1,48 @@
-from pathlib import Path
+import importlib
 
 import click
 
-from project import InvokerError, Project
 
-
-@click.group()
+class LazyGroup(click.Group):
+    """Click group that imports its subcommands only when they are requested.
+
+    @lazy_subcommands: mapping of command name to "module:attribute" of the command
+    """
+    def __init__(self, *args, lazy_subcommands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx):
+        return sorted([*super().list_commands(ctx), *self.lazy_subcommands])
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.lazy_subcommands:
+            return super().get_command(ctx, cmd_name)
+        module_name, attr_name = self.lazy_subcommands[cmd_name].rsplit(":", 1)
+        return getattr(importlib.import_module(module_name), attr_name)
+
+
+@click.group(
+    cls=LazyGroup,
+    lazy_subcommands={
+        "daemon": "invoker_daemon:daemon",
+        "init": "_impl:init",
+        "lint": "_impl:lint",
+        "rebuild": "_impl:rebuild",
+        "run": "_impl:run",
+        "debug": "_impl:debug",
+    },
+)
 def cli():
     pass
 
 
-@cli.command()
-def init():
-    click.secho("Initializing new project at current directory...", fg="yellow")
-    project = Project(Path())
-    try:
-        project.initialize()
-        click.secho("Success!", fg="green")
-    except InvokerError as err:
-        click.secho("Invoker Error: ", err=True, nl=False, fg="red")
-        click.echo(err, err=True)
-
-
-@cli.command()
-def lint():
-    project = Project(Path())
-    project.load()
-    project.lint()
-
-
-@cli.command()
-def rebuild():
-    click.secho("Rebuildng project...", fg="yellow")
-    project = Project(Path()).load()
-    try:
-        project.rebuild()
-        click.secho("Success!", fg="green")
-    except InvokerError as err:
-        click.secho("Invoker Error: ", err=True, nl=False, fg="red")
-        click.echo(err, err=True)
-
-
-@cli.group()
+@cli.group(
+    cls=LazyGroup,
+    lazy_subcommands={
+        "module": "_impl:module",
+        "script": "_impl:script",
+    },
+)
 def create():
     pass
-
-
-@create.command()
-@click.argument("module_name")
-def module(module_name):
-    click.secho(f"Creating new module {module_name}...", fg="yellow")
-    project = Project(Path())
-    try:
-        project.load()
-        project.create_module(module_name)
-        project.validate()
-        click.secho("Success!", fg="green")
-    except InvokerError as err:
-        click.secho("Invoker Error: ", err=True, nl=False, fg="red")
-        click.echo(err, err=True)
-
-
-@create.command()
-@click.argument("script_name")
-def script(script_name):
-    click.secho(f"Creating new script {script_name}...", fg="yellow")
-    project = Project(Path())
-    try:
-        project.load()
-        project.create_script(script_name)
-        project.validate()
-        click.secho("Success!", fg="green")
-    except InvokerError as err:
-        click.secho("Invoker Error: ", err=True, nl=False, fg="red")
-        click.echo(err, err=True)
-
-
-@cli.command()
-@click.argument("script_name")
-def run(script_name):
-    click.secho(f"Running script {script_name}...", fg="yellow")
-    project = Project(Path())
-    try:
-        project.load()
-        project.run_script(script_name)
-    except InvokerError as err:
-        click.secho("Invoker Error: ", err=True, nl=False, fg="red")
-        click.echo(err, err=True)
-
-
-@cli.command()
-@click.argument("script_name")
-def debug(script_name):
-    click.secho(f"Running script {script_name}...", fg="yellow")
-    project = Project(Path())
-    try:
-        project.load()
-        project.debug_script(script_name)
-    except InvokerError as err:
-        click.secho("Invoker Error: ", err=True, nl=False, fg="red")
-        click.echo(err, err=True)
@@ -0,0 +1,116 @@
+import os
+from pathlib import Path
+import sys
+
+import click
+
+# Commands that need a terminal, stream long-running output, or write to the terminal
+# from child processes (which redirect_stdout cannot capture) are never forwarded.
+_LOCAL_COMMANDS = {"daemon", "run", "debug", "lint"}
+
+
+def get_socket_path():
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / "invoker.sock"
+    # A fixed name in a shared temp directory could be claimed first by another user, so
+    # fall back to a private per-user directory instead
+    cache_dir = Path(os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache") / "invoker"
+    cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+    os.chmod(cache_dir, 0o700)
+    return cache_dir / "invoker.sock"
+
+
+def _is_own_socket(socket_path):
+    try:
+        return os.stat(socket_path).st_uid == os.getuid()
+    except FileNotFoundError:
+        return False
+
+
+def _dispatch(cwd, argv):
+    import contextlib
+    import io
+    import traceback
+
+    from invoker import cli
+    from project import get_project
+    from util import generated_message
+
+    # The cached Project is keyed on the relative root, which changes meaning with cwd,
+    # and the cached signature header carries a date that goes stale in a long-lived process
+    get_project.cache_clear()
+    generated_message.cache_clear()
+    stdout, stderr = io.StringIO(), io.StringIO()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            os.chdir(cwd)
+            # Without standalone_mode, click returns the exit code instead of raising Exit
+            exit_code = cli.main(argv, prog_name="invoker", standalone_mode=False) or 0
+        except click.ClickException as err:
+            err.show()
+            exit_code = err.exit_code
+        except click.exceptions.Abort:
+            click.echo("Aborted!", err=True)
+            exit_code = 1
+        except SystemExit as err:
+            exit_code = err.code if isinstance(err.code, int) else 1
+        except Exception:
+            # Report the crash to the client rather than dropping the connection
+            traceback.print_exc()
+            exit_code = 1
+    return dict(stdout=stdout.getvalue(), stderr=stderr.getvalue(), exit_code=exit_code)
+
+
+@click.command()
+def daemon():
+    """Serve invoker commands from a long-running process over a unix socket."""
+    # Imported here rather than at module level so that listing commands stays cheap
+    import json
+    import socketserver
+
+    # Pay for the heavy imports once, up front
+    import _impl  # noqa: F401
+    import project  # noqa: F401
+    import util  # noqa: F401
+
+    class InvokerRequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            request = json.loads(self.rfile.readline())
+            response = _dispatch(request["cwd"], request["argv"])
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+
+    socket_path = get_socket_path()
+    socket_path.unlink(missing_ok=True)
+    click.secho(f"Listening on {socket_path}...", fg="yellow")
+    # Handlers chdir into the caller's directory, so requests are served one at a time
+    with socketserver.UnixStreamServer(str(socket_path), InvokerRequestHandler) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            socket_path.unlink(missing_ok=True)
+
+
+def client_main():
+    import json
+    import socket
+
+    argv = sys.argv[1:]
+    socket_path = get_socket_path()
+    # Never hand argv and cwd to a socket that another user put in place
+    if (argv and argv[0] in _LOCAL_COMMANDS) or not _is_own_socket(socket_path):
+        os.execvp("invoker", ["invoker", *argv])
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(socket_path))
+            request = dict(cwd=os.getcwd(), argv=argv)
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            response = json.loads(sock.makefile("rb").readline())
+    except (FileNotFoundError, ConnectionRefusedError):
+        # No daemon running; behave exactly like the regular CLI
+        os.execvp("invoker", ["invoker", *argv])
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    sys.exit(response["exit_code"])
@@ -1,23 +1,76 @@
-from importlib import metadata
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import json
+import os
 from pathlib import Path
 import re
+import runpy
+import shutil
 import subprocess
+import sys
 
-from util import copy_resource, compute_resource_hash, compute_file_hash, to_camel_case
+import click
 
-class InvokerError(Exception):
-    pass
+from util import (
+    cli_version, copy_resource, compute_resource_hash, compute_file_hash, to_camel_case,
+)
+
+_VERSION_PREFIX = "# Invoker: v"
+_DEBUG_SCRIPT_RE = re.compile(r"^(\w+\.\w+)(?::(\d+))?$")
+# Top-level modules of this CLI. Projects may define modules with the same names.
+_CLI_MODULES = ("invoker", "_impl", "invoker_daemon", "project", "util", "resources")
+
+def _read_first_line(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+    try:
+        buf = os.read(fd, 128)
+    finally:
+        os.close(fd)
+    return buf.split(b"\n", 1)[0].decode("ascii", "ignore")
+
+def _parse_version(line):
+    # Fixed-format "# Invoker: vX.Y.Z" header, cheaper to slice than to regex-match
+    if not line.startswith(_VERSION_PREFIX):
+        return None
+    version = line[len(_VERSION_PREFIX):].rstrip()
+    parts = version.split(".")
+    if len(parts) != 3 or not all(part.isdigit() for part in parts):
+        return None
+    return version
+
+def _stat_fingerprint(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+def _iter_module_inits(root_path):
+    # Yields plain string paths; callers only build a Path for the files they act on
+    with os.scandir(root_path) as it:
+        for entry in it:
+            if entry.is_dir() and not entry.name.startswith("."):
+                yield os.path.join(entry.path, "__init__.py")
+
+class InvokerError(click.ClickException):
+    def show(self, file=None):
+        click.secho("Invoker Error: ", err=True, nl=False, fg="red")
+        click.echo(self.format_message(), err=True)
 
 class Project:
     def __init__(self, root_path):
-        self.root_path = Path(root_path)
-        self.invoker_path = root_path / "invoker.py"
+        self.root_path = root_path if isinstance(root_path, Path) else Path(root_path)
+        self.invoker_path = self.root_path / "invoker.py"
+        self.cache_dir = self.root_path / ".invoker_cache"
+        self.cache_path = self.cache_dir / "rebuild.json"
+        self._stat_cache = {}
+        self._validated = False
 
     def initialize(self):
-        if self.invoker_path.exists():
+        try:
+            copy_resource("invoker.resource.py", self.invoker_path, sign=True, exclusive=True)
+        except FileExistsError:
             raise InvokerError(f"invoker module already exists at {self.invoker_path}.")
-        copy_resource("invoker.resource.py", self.invoker_path, sign=True)
-        self.validate()
         return self
 
     def load(self):
@@ -25,21 +78,28 @@ class Project:
         return self
 
     def validate(self):
-        if not self.invoker_path.exists():
+        if self._validated:
+            return True
+        if not os.path.exists(self.invoker_path):
             raise InvokerError("invoker.py file is missing in project.")
+        self._validated = True
         return True
 
     def lint(self):
+        # black and isort rewrite the same files and flake8 should report on their output,
+        # so the tools run in order. black and flake8 already use every CPU by default;
+        # isort is single-process unless asked.
         subprocess.call(['black', self.root_path])
-        subprocess.call(['isort', self.root_path])
+        subprocess.call(['isort', '--jobs', str(os.cpu_count() or 1), self.root_path])
         subprocess.call(['flake8', self.root_path])
 
     def create_module(self, module_name):
         # Create module directory
         module_path = self.root_path / module_name
-        if module_path.exists():
+        try:
+            module_path.mkdir()
+        except FileExistsError:
             raise InvokerError(f"module already exists at {module_path}.")
-        module_path.mkdir()
 
         # Generate module __init__.py resource
         module_init_path = module_path / "__init__.py"
@@ -50,7 +110,7 @@ class Project:
         copy_resource(
             "module_base.resource.py",
             module_base_path,
-            preprocess_fn=lambda l: l.replace("__MODULE__", to_camel_case(module_name)),
+            substitutions={b"__MODULE__": to_camel_case(module_name).encode()},
         )
 
     def create_script(self, script_name):
@@ -59,33 +119,55 @@ class Project:
             script_name = script_name.removesuffix(".py")
         # Add boilerplate base script
         script_path = self.root_path / f"{script_name}.py"
-        if script_path.exists():
+        try:
+            copy_resource(
+                "script.resource.py",
+                script_path,
+                substitutions={b"__SCRIPT__": to_camel_case(script_name).encode()},
+                exclusive=True,
+            )
+        except FileExistsError:
             raise InvokerError(f"script already exists at {script_path}.")
-        copy_resource(
-            "script.resource.py",
-            script_path,
-            preprocess_fn=lambda l: l.replace("__SCRIPT__", to_camel_case(script_name)),
-        )
         script_path.chmod(0o744)
 
-    def run_script(self, script_name):
+    def run_script(self, script_name, isolated=False):
         # Fix script name
         if not script_name.endswith(".py"):
             script_name = script_name + ".py"
         script_path = self.root_path / f"{script_name}"
-        if not script_path.exists():
+        if not os.path.exists(script_path):
             raise InvokerError(f"script does not exist at {script_path}.")
-        subprocess.call(['python', 'invoker.py', 'run', script_name])
+        self._invoke(['run', script_name], isolated=isolated)
 
-    def debug_script(self, script_name_with_line_num):
-        script_match = re.match(r"^(\w+\.\w+)(?::(\d+))?$", script_name_with_line_num)
+    def debug_script(self, script_name_with_line_num, isolated=False):
+        script_match = _DEBUG_SCRIPT_RE.match(script_name_with_line_num)
         script_name = script_match.group(1)
         embed_line_num = int(script_match.group(2)) if script_match.group(2) else None
 
         script_path = self.root_path / f"{script_name}"
-        if not script_path.exists():
+        if not os.path.exists(script_path):
             raise InvokerError(f"script does not exist at {script_path}.")
-        subprocess.call(['python', 'invoker.py', 'debug', script_name_with_line_num])
+        self._invoke(['debug', script_name_with_line_num], isolated=isolated)
+
+    def _invoke(self, argv, isolated=False):
+        if isolated:
+            subprocess.call(['python', 'invoker.py', *argv])
+            return
+        # Run the project's invoker.py in this interpreter. The project's own invoker.py
+        # and modules may share names with the CLI's modules, so those are swapped out of
+        # sys.modules while the script runs and restored afterwards.
+        is_cli_module = lambda name: name.partition(".")[0] in _CLI_MODULES
+        saved_argv, saved_path = sys.argv, list(sys.path)
+        saved_modules = {name: sys.modules.pop(name) for name in list(sys.modules) if is_cli_module(name)}
+        sys.argv = [str(self.invoker_path), *argv]
+        sys.path.insert(0, str(self.root_path.resolve()))
+        try:
+            runpy.run_path(str(self.invoker_path), run_name="__main__")
+        finally:
+            sys.argv, sys.path[:] = saved_argv, saved_path
+            for name in [name for name in sys.modules if is_cli_module(name)]:
+                del sys.modules[name]
+            sys.modules.update(saved_modules)
 
     def create_workflow(self, workflow_name):
         # Fix workflow name
@@ -93,52 +175,84 @@ class Project:
             workflow_name = workflow_name.removesuffix(".py")
         # Add boilerplate base workflow
         workflow_path = self.root_path / f"{workflow_name}.py"
-        if workflow_path.exists():
+        try:
+            copy_resource(
+                "workflow.resource.py",
+                workflow_path,
+                substitutions={b"__WORKFLOW__": to_camel_case(workflow_name).encode()},
+                exclusive=True,
+            )
+        except FileExistsError:
             raise InvokerError(f"workflow already exists at {workflow_path}.")
-        copy_resource(
-            "workflow.resource.py",
-            workflow_path,
-            preprocess_fn=lambda l: l.replace("__WORKFLOW__", to_camel_case(workflow_name)),
-        )
         workflow_path.chmod(0o744)
 
     def rebuild(self):
-        self._rebuild_resource("invoker.resource.py", self.invoker_path, sign=True)
-        for path in self.root_path.iterdir():
-            if not path.is_dir():
-                continue
-            init_path = path / "__init__.py"
-            if not init_path.exists():
+        version_prefix = _VERSION_PREFIX + cli_version()
+        self._load_stat_cache()
+        targets = [("invoker.resource.py", self.invoker_path)]
+        for init_path in _iter_module_inits(self.root_path):
+            first_line = _read_first_line(init_path)
+            if first_line is None or not first_line.startswith(version_prefix):
                 continue
-            with open(init_path) as init_f:
-                if not init_f.readline().startswith(f"# Invoker: v{metadata.version('invoker')}"):
-                    continue
-            self._rebuild_resource("module_init.resource.py", init_path, sign=True)
+            targets.append(("module_init.resource.py", Path(init_path)))
+        # Each target is read, hashed and possibly rewritten independently; file I/O and
+        # hashlib release the GIL, so threads overlap the work.
+        with ThreadPoolExecutor() as executor:
+            list(executor.map(
+                lambda target: self._rebuild_resource(*target, sign=True), targets
+            ))
+        self._save_stat_cache()
+
+    def _load_stat_cache(self):
+        try:
+            with open(self.cache_path) as cache_f:
+                self._stat_cache = json.load(cache_f)
+        except (FileNotFoundError, ValueError):
+            self._stat_cache = {}
+
+    def _save_stat_cache(self):
+        # Keep the cache out of version control without touching the project's .gitignore
+        if not os.path.isdir(self.cache_dir):
+            self.cache_dir.mkdir()
+            (self.cache_dir / ".gitignore").write_text("*\n")
+        with open(self.cache_path, "w") as cache_f:
+            json.dump(self._stat_cache, cache_f)
 
     def _rebuild_resource(self, resource_name, path, sign=False):
-        if not path.exists():
+        resource_hash = compute_resource_hash(resource_name)
+        # Skip hashing files untouched since the last rebuild against the same resource
+        build_entry = lambda: dict(
+            fp=_stat_fingerprint(path), resource_hash=resource_hash, version=cli_version(),
+        )
+        try:
+            if self._stat_cache.get(str(path)) == build_entry():
+                return
+        except FileNotFoundError:
             raise InvokerError(f"{resource_name} does not exist at {path}!")
+        self._check_resource(resource_name, path, resource_hash, sign)
+        self._stat_cache[str(path)] = build_entry()
 
-        resource_hash = compute_resource_hash(resource_name)
+    def _check_resource(self, resource_name, path, resource_hash, sign):
         cached_hash, computed_hash = compute_file_hash(path)
         if cached_hash != computed_hash:
-            backup_path = Path(str(path) + ".bak")
-            path.rename(backup_path)
+            # Keep the manually edited file around; copying it leaves path in place until
+            # copy_resource atomically replaces it.
+            shutil.copy2(path, Path(str(path) + ".bak"))
             copy_resource(resource_name, path, sign=sign)
             return
         if resource_hash != cached_hash:
             copy_resource(resource_name, path, sign=sign)
             return
 
-        with open(path, "r") as fp:
-            file_version_line = fp.readline()
-        version_match = re.match(r"# Invoker: v(\d+\.\d+\.\d+)$", file_version_line)
-
-        if not version_match:
+        version = _parse_version(_read_first_line(path) or "")
+        if version is None:
             copy_resource(resource_name, path, sign=sign)
             return
 
-        version = version_match.group(1)
-        if version != metadata.version('invoker'):
+        if version != cli_version():
             copy_resource(resource_name, path, sign=sign)
             return
+
+@functools.lru_cache(maxsize=1)
+def get_project(root_path=Path()):
+    return Project(root_path)
@@ -33,20 +33,19 @@ python invoker.py debug my_script.py:14
 Invoker projects can also be managed using a python CLI tool. For more information, see https://github.com/budmonde/invoker
 """
 import argparse
-import copy
-import cProfile as profile
+import functools
 import importlib
 import importlib.util
-import inspect
 import logging
-import logging.config
 import os
 import pprint
-import pstats
 import re
 import sys
 from pathlib import Path
 
+_CAMEL_SPLIT_RE = re.compile(r"[A-Z][^A-Z]*")
+_SCRIPT_NAME_RE = re.compile(r"^(\w+\.\w+)(?::(\d+))?$")
+
 
 class Script:
     """
@@ -69,31 +68,40 @@ class Script:
 
         parser_manager = ParserManager()
         parser_manager.add_arguments(self.args())
-        for module_name, module_mode in self.modules().items():
-            cls = _load_class(module_name, module_mode)
-            parser_manager.add_arguments(cls.args(), key_prefix = module_name)
-        script_config = self.build_config(parser_manager.parse_args(args_dict, args_list))
-
-        module_conf = {}
-        for module_name, module_mode in self.modules().items():
-            cls = _load_class(module_name, module_mode)
-
-            is_valid_module_conf = lambda key: len(key.split(".")) == 2
-            module_conf_matches_module = lambda key: key.split(".")[0] == module_name
-            get_module_conf_key = lambda key: key.split(".")[1]
-            module_args = {
-                get_module_conf_key(key) : value
-                for key, value in script_config.items()
-                if is_valid_module_conf(key) and module_conf_matches_module(key)
-            }
-
-            cls_inst = cls(module_args)
+        referenced_modules = _referenced_modules(args_dict, args_list)
+        module_classes = {
+            module_name: _load_class(module_name, module_mode)
+            for module_name, module_mode in self.modules().items()
+        }
+        module_defaults = {}
+        for module_name, cls in module_classes.items():
+            if referenced_modules is None or module_name in referenced_modules:
+                parser_manager.add_arguments(cls.args(), key_prefix = module_name)
+            else:
+                # Nothing overrides this module, so its defaults skip the parser entirely.
+                # Keys are normalized the way argparse derives option dests.
+                module_defaults.update({f"{module_name}.{k.replace('-', '_')}": v for k, v in cls.args().items()})
+        script_config = self.build_config({**module_defaults, **parser_manager.parse_args(args_dict, args_list)})
+
+        # Split "<module>.<arg>" keys out into per-module buckets in a single pass, filling
+        # in self.opt as we go rather than rebuilding it from the final config
+        self.opt = argparse.Namespace()
+        module_args = {module_name: {} for module_name in module_classes}
+        script_args = {}
+        for key, value in script_config.items():
+            prefix, _, module_arg = key.partition(".")
+            if prefix in module_args and module_arg and "." not in module_arg:
+                module_args[prefix][module_arg] = value
+            else:
+                script_args[key] = value
+                setattr(self.opt, key, _deserialize_config(value) if isinstance(value, dict) else value)
+
+        for module_name, cls in module_classes.items():
+            cls_inst = cls(module_args[module_name])
             setattr(self, module_name, cls_inst)
-            module_conf[module_name] = _serialize_opt(cls_inst.opt)
-            for module_arg in module_args.keys():
-                del script_config[".".join([module_name, module_arg])]
-        script_config.update(module_conf)
-        self.opt = _deserialize_config(script_config)
+            script_args[module_name] = _serialize_opt(cls_inst.opt)
+            setattr(self.opt, module_name, _deserialize_config(script_args[module_name]))
+        script_config = script_args
 
         logging.info("Initialized script %s with options:\n%s", type(self).__name__, pprint.pformat(script_config, sort_dicts=False))
 
@@ -114,6 +122,8 @@ class Script:
         pass
 
     def profile(self, top=10):
+        import cProfile as profile
+        import pstats
         logging.info("Profiling script %s", type(self).__name__)
         prof = profile.Profile()
         prof.enable()
@@ -123,6 +133,7 @@ class Script:
         stats.print_stats(top)
 
     def embed(self):
+        import inspect
         from IPython.terminal.embed import InteractiveShellEmbed
         caller_frame = inspect.currentframe().f_back
         module = get_module(caller_frame.f_globals["__file__"])
@@ -133,15 +144,18 @@ class Script:
         shell()
 
 
+@functools.lru_cache(maxsize=128)
 def _to_underscore_case(string):
-    return "_".join([token.lower() for token in re.findall("[A-Z][^A-Z]*", string)])
+    return "_".join([token.lower() for token in _CAMEL_SPLIT_RE.findall(string)])
 
 
+@functools.lru_cache(maxsize=128)
 def _to_camel_case(string):
     return "".join([token.capitalize() for token in string.split("_")])
 
 
 def _initialize_logger(log_to_console, logfile_root, logfile_name):
+    import logging.config
     logger_dict = {
         "version": 1,
         "formatters": {},
@@ -166,10 +180,8 @@ def _initialize_logger(log_to_console, logfile_root, logfile_name):
         logger_dict["root"]["handlers"].append("console")
 
     if logfile_root is not None:
-        logfile_root = Path(logfile_root)
-        logfile_root.mkdir(exist_ok=True, parents=True)
-        logfile_path = logfile_root / f"{logfile_name}.log"
-        do_rollover = True if logfile_path.exists() else False
+        logfile_path = _ensure_logdir(logfile_root) / f"{logfile_name}.log"
+        do_rollover = os.path.exists(logfile_path)
         logger_dict["formatters"]["verbose"] = {
             "format": "%(asctime)s,%(msecs)d [%(levelname)-8s] %(filename)s:%(lineno)d.%(funcName)s() %(message)s",
             "datefmt": "%Y-%m-%d %H:%M:%S",
@@ -189,6 +201,13 @@ def _initialize_logger(log_to_console, logfile_root, logfile_name):
         logging.getLogger("root").handlers[1].doRollover()
 
 
+@functools.lru_cache(maxsize=4)
+def _ensure_logdir(logfile_root):
+    logfile_root = Path(logfile_root)
+    logfile_root.mkdir(exist_ok=True, parents=True)
+    return logfile_root
+
+
 class InvokerFormatter(logging.Formatter):
     LVL2COLOR = {
         logging.DEBUG: "\x1b[38m", #  grey
@@ -212,15 +231,16 @@ class ParserManager:
 
     def add_arguments(self, default_args, key_prefix=None):
         for k, v in default_args.items():
+            t = type(v)
             try:
-                if type(v) == list:
+                if t is list:
                     self.parser.add_argument(
                         _build_key(k, key_prefix),
                         type=type(v[0]) if len(v) > 0 else str,
                         nargs="+",
                         default=v
                     )
-                elif type(v) == bool:
+                elif t is bool:
                     self.parser.add_argument(
                         _build_key(k, key_prefix),
                         action="store_true" if not v else "store_false",
@@ -228,7 +248,7 @@ class ParserManager:
                 else:
                     self.parser.add_argument(
                         _build_key(k, key_prefix),
-                        type=type(v),
+                        type=t,
                         default=v
                     )
             except argparse.ArgumentError:
@@ -237,17 +257,18 @@ class ParserManager:
     def parse_args(self, args_dict, fallback_args_list, key_prefix=None):
         if args_dict is not None:
             args_list = []
+            get_default = self.parser.get_default
             for k, v in args_dict.items():
-                if type(v) == list:
-                    args_list.append(_build_key(k, key_prefix))
-                    for item in v:
-                        args_list.append(str(item))
-                elif type(v) == bool:
-                    if v != self.parser.get_default(k):
-                        args_list.append(_build_key(k, key_prefix))
+                t = type(v)
+                key = _build_key(k, key_prefix)
+                if t is list:
+                    args_list.append(key)
+                    args_list.extend(map(str, v))
+                elif t is bool:
+                    if v != get_default(k):
+                        args_list.append(key)
                 else:
-                    args_list.append(_build_key(k, key_prefix))
-                    args_list.append(str(v))
+                    args_list += (key, str(v))
             return self._parse_args(args_list)
         elif fallback_args_list is not None:
             return self._parse_args(fallback_args_list)
@@ -262,6 +283,20 @@ def _build_key(kname: str, key_prefix: str =None) -> str:
     return f"--{kname}" if key_prefix is None else f"--{key_prefix}.{kname}"
 
 
+def _referenced_modules(args_dict, args_list):
+    """Names of modules with options overridden by args_dict or args_list, or None if all
+    module options need to be registered with the parser (e.g. to print --help)."""
+    if args_dict is not None:
+        keys = list(args_dict)
+    else:
+        tokens = sys.argv[1:] if args_list is None else args_list
+        # argparse also accepts unambiguous abbreviations such as --hel
+        if any(token == "-h" or (len(token) > 2 and "--help".startswith(token)) for token in tokens):
+            return None
+        keys = [token[2:] for token in tokens if token.startswith("--")]
+    return {key.partition(".")[0] for key in keys if "." in key}
+
+
 def _load_class(module_name, module_mode):
     module_full_name = module_name if __package__ == "" else ".".join([__package__, module_name])
     return importlib.import_module(module_full_name).get_class(module_mode)
@@ -286,16 +321,23 @@ class Module:
 
 
 def _serialize_opt(opt):
-    out = vars(copy.deepcopy(opt))
-    for k, v in out.items():
+    # Containers are copied so the script's and the module's options stay independent;
+    # a full deepcopy of every value is not needed for that
+    out = {}
+    for k, v in vars(opt).items():
         if isinstance(v, argparse.Namespace):
             out[k] = _serialize_opt(v)
+        elif isinstance(v, (list, dict, set)):
+            out[k] = v.copy()
         else:
             out[k] = v
     return out
 
 
 def _deserialize_config(config):
+    # Flat configs (the common case) need no recursion
+    if not any(isinstance(v, dict) for v in config.values()):
+        return argparse.Namespace(**config)
     opt = argparse.Namespace()
     for k, v in config.items():
         if isinstance(v, dict):
@@ -305,13 +347,27 @@ def _deserialize_config(config):
     return opt
 
 
+# Script modules loaded by get_module() or instrumented for debugging, keyed on absolute
+# path. Scripts are kept out of sys.modules, where their bare names could shadow
+# project modules (e.g. a "dataset.py" script next to a "dataset/" module).
+_SCRIPT_MODULES = {}
+
+
+def _module_name(file_path):
+    return os.path.relpath(file_path).replace(os.sep, ".").replace(".py", "")
+
+
 def get_module(file_name):
     if file_name is None:
         return None
-    module_name = file_name.replace(os.sep, ".").replace(".py", "")
-    spec = importlib.util.spec_from_file_location(module_name, file_name)
+    file_path = os.path.abspath(file_name)
+    module = _SCRIPT_MODULES.get(file_path)
+    if module is not None:
+        return module
+    spec = importlib.util.spec_from_file_location(_module_name(file_path), file_name)
     module = importlib.util.module_from_spec(spec)
     spec.loader.exec_module(module)
+    _SCRIPT_MODULES[file_path] = module
     return module
 
 
@@ -328,38 +384,44 @@ def get_embed_instrumented_module(file_name, instrument_line_num, instrument_lin
     except StopIteration:
         raise RuntimeError("Invalid script %s", file_name)
 
-    get_indent = lambda line: len(line) - len(line.lstrip())
-
-    valid_instrument_line = instrument_line_num is not None and instrument_line_num < len(lines)
-    if not valid_instrument_line:
-        in_run = False
-        for index in range(script_line_number, len(lines) - 1):
-            line = lines[index]
-            if line.lstrip().startswith("def run"):
-                in_run = True
-                indent_size = get_indent(line) + 4
-            elif in_run:
-                if len(line.strip()) > 0 and get_indent(line) < (indent_size or 0):
-                    instrument_line_num = index - 1
-                    break
-        if not valid_instrument_line:
-            instrument_line_num = len(lines) - 1
+    if instrument_line_num is not None and instrument_line_num <= len(lines):
+        # Instrument right after the requested line, at its indentation
+        line = lines[instrument_line_num - 1]
+        indent_size = len(line) - len(line.lstrip())
     else:
-        indent_size = get_indent(lines[instrument_line_num - 1])
+        # Default to instrumenting the end of the script's run() method
+        indent_size = None
+        instrument_line_num = None
+        for index, line in enumerate(lines[script_line_number:], start=script_line_number):
+            stripped = line.lstrip()
+            if not stripped:
+                continue
+            indent = len(line) - len(stripped)
+            if indent_size is None:
+                if stripped.startswith("def run("):
+                    indent_size = indent + 4
+            elif indent < indent_size:
+                break
+            else:
+                instrument_line_num = index + 1
+        if instrument_line_num is None:
+            raise RuntimeError(f"Script {file_name} does not implement run()")
 
     instrument_line = " " * indent_size + f"{instrument_line}\n"
 
     new_lines = list(lines)
     new_lines.insert(instrument_line_num, instrument_line)
-    new_file = file_name.replace(".py", "_instrumented.py")
-
-    with open(new_file, "w") as fp:
-        fp.writelines(new_lines)
 
-    module = get_module(new_file)
-    module.__file__ = file_name
-
-    os.remove(new_file)
+    # Compile the instrumented source in memory; tracebacks still point at file_name. It
+    # is cached as the script's module so get_module() hands it back to embed().
+    file_path = os.path.abspath(file_name)
+    code = compile("".join(new_lines), file_path, "exec")
+    module = importlib.util.module_from_spec(
+        importlib.util.spec_from_loader(_module_name(file_path), loader=None)
+    )
+    module.__file__ = file_path
+    exec(code, module.__dict__)
+    _SCRIPT_MODULES[file_path] = module
     return module
 
 
@@ -374,18 +436,19 @@ def get_script(file_name, instrument=False, instrument_line_num=None, instrument
 
 
 if __name__ == "__main__":
-    _initialize_logger(True, None, "invoker")
-
     parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
     parser.add_argument("command", choices = ["run", "debug"], type=str, help="Invoker script command.")
     parser.add_argument("script_name", type=str, help="Target invoker script name. Optionally include line number to run until as <script_name>:<line_numbrer>")
 
+    # Usage and argument errors (including -h/--help) exit before logging is set up or
+    # any user code is loaded
     if (len(sys.argv) < 3):
         parser.print_help(sys.stderr)
         exit()
 
     args = parser.parse_args(sys.argv[1:3])
-    script_match = re.match(r"^(\w+\.\w+)(?::(\d+))?$", args.script_name)
+    _initialize_logger(True, None, "invoker")
+    script_match = _SCRIPT_NAME_RE.match(args.script_name)
     if not script_match:
         logging.error("Invalid script name: %s.", args.script_name)
         exit()
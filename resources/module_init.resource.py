@@ -1,18 +1,30 @@
 import importlib
-import importlib.resources
 import inspect
-from pathlib import Path
+import os
 
 # Import all module classes
 _MODULE_NAME = "".join([token.capitalize() for token in __package__.split(".")[-1].split("_")])
+
+
+def _iter_candidate_files():
+    # Only import files that mention the module name; anything else cannot define a class
+    # named "*<ModuleName>".
+    with os.scandir(os.path.dirname(__file__)) as it:
+        for entry in it:
+            if not entry.name.endswith(".py") or entry.name == "__init__.py":
+                continue
+            with open(entry.path, "rb") as f:
+                if _MODULE_NAME.encode() in f.read():
+                    yield entry.name
+
+
 _CLASSES = {
     name: cls
     for list_of_classes in [
         inspect.getmembers(module, inspect.isclass)
         for module in [
-            importlib.import_module(f"{__package__}.{Path(fname).stem}")
-            for fname in importlib.resources.contents(__package__)
-            if Path(fname).suffix == ".py" and fname != "__init__.py"
+            importlib.import_module(f"{__package__}.{fname[:-len('.py')]}")
+            for fname in _iter_candidate_files()
         ]
     ]
     for name, cls in list_of_classes
@@ -1,49 +1,124 @@
 from datetime import date
-from importlib import metadata, resources
+from importlib import resources
+import functools
 import hashlib
+import os
+from pathlib import Path
+import stat
 
 
-def _compute_hash(string):
-    hasher = hashlib.md5()
+# Hashes only fingerprint generated files, so a fast non-cryptographic-grade digest is
+# fine. Files signed before "# Hash-Algo:" was introduced are md5.
+HASH_ALGO = "blake2b"
+# Empty hashers copied per use; copy() skips re-running the digest's initialisation
+_HASHERS = {
+    "md5": hashlib.md5().copy,
+    "blake2b": hashlib.blake2b(digest_size=16).copy,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _resources_root():
+    return resources.files("resources")
+
+
+def _compute_hash(string, algo=HASH_ALGO):
+    hasher = _HASHERS[algo]()
     hasher.update(string)
     return hasher.hexdigest()
 
 
+# Packaged resources are immutable for the lifetime of the process. Tests that swap
+# resources out need to call compute_resource_hash.cache_clear().
+@functools.lru_cache(maxsize=None)
 def compute_resource_hash(resource_fn):
-    with resources.open_binary("resources", resource_fn) as f:
-        return _compute_hash(f.read())
+    with _resources_root().joinpath(resource_fn).open("rb") as f:
+        return _compute_file_digest(f)
+
+
+def _compute_file_digest(f, algo=HASH_ALGO):
+    if hasattr(hashlib, "file_digest"):  # Python 3.11+
+        return hashlib.file_digest(f, _HASHERS[algo]).hexdigest()
+    hasher = _HASHERS[algo]()
+    buf = bytearray(1 << 20)
+    view = memoryview(buf)
+    while size := f.readinto(buf):
+        hasher.update(view[:size])
+    return hasher.hexdigest()
 
 
 def compute_file_hash(path):
-    with open(path, "r") as f:
-        while True:
-            hash_line = f.readline()
-            if hash_line.startswith("# Hash:"):
+    stored_hash, algo = None, "md5"
+    with open(path, "rb") as f:
+        for hash_line in f:
+            # The signature header is a block of comments; stop at the first line of code
+            if not hash_line.startswith(b"#"):
+                break
+            if hash_line.startswith(b"# Hash-Algo:"):
+                algo = hash_line.strip().split(b"\t")[1].decode("ascii")
+            elif hash_line.startswith(b"# Hash:"):
+                stored_hash = hash_line.strip().split(b"\t")[1].decode("ascii")
                 break
-        stored_hash = hash_line.strip().split("\t")[1]
-        computed_hash = _compute_hash(f.read().encode('ascii'))
+        # An algorithm this version does not know (e.g. from a newer invoker) cannot be
+        # verified, so the file is reported as modified
+        computed_hash = _compute_file_digest(f, algo) if algo in _HASHERS else None
     return stored_hash, computed_hash
 
 
-GENERATED_MESSAGE = f"""\
-# Invoker: v{metadata.version('invoker')}
+@functools.lru_cache(maxsize=None)
+def cli_version():
+    from importlib import metadata
+    return metadata.version("invoker")
+
+
+@functools.lru_cache(maxsize=None)
+def generated_message():
+    return f"""\
+# Invoker: v{cli_version()}
 # DO NOT MANUALLY EDIT THIS FILE.
 #
 # This script was generated with invoker.
 # To regenerate file, run `invoker rebuild`.
-# Date:\t{date.today().strftime("%Y-%m-%d")}
+# Date:\t{date.today().isoformat()}
 """
 
 
-def copy_resource(src_fn, dst_path, sign=False, preprocess_fn=lambda l: l):
-    with resources.open_binary("resources", src_fn) as f:
-        file_hash = _compute_hash(f.read())
-    with resources.open_text("resources", src_fn) as inf, open(dst_path, "w") as outf:
-        if sign:
-            outf.write(GENERATED_MESSAGE)
-            outf.write(f"# Hash:\t{file_hash}\n")
-        for line in inf:
-            outf.write(preprocess_fn(line))
+def copy_resource(src_fn, dst_path, sign=False, substitutions=None, exclusive=False):
+    data = _resources_root().joinpath(src_fn).read_bytes()
+    header = None
+    if sign:
+        header = generated_message() + (
+            f"# Hash-Algo:\t{HASH_ALGO}\n"
+            f"# Hash:\t{_compute_hash(data)}\n"
+        )
+    for token, value in (substitutions or {}).items():
+        data = data.replace(token, value)
+    # Exclusive writes fail with FileExistsError instead of clobbering dst_path
+    if exclusive:
+        with open(dst_path, "xb") as outf:
+            _write_resource(outf, header, data)
+        return
+    # Otherwise write next to the destination and swap it in, so it is never left
+    # half-written. A symlinked destination has its target replaced, not the link.
+    dst_path = Path(os.path.realpath(dst_path))
+    tmp_path = dst_path.with_name(dst_path.name + ".tmp")
+    try:
+        with open(tmp_path, "wb") as outf:
+            _write_resource(outf, header, data)
+        try:
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(dst_path).st_mode))
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, dst_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def _write_resource(outf, header, data):
+    if header is not None:
+        outf.write(header.encode("ascii"))
+    outf.write(data)
 
 
 def to_camel_case(string):